@@ -11,9 +11,34 @@ Dependencies:
 - Chainlit: Used for authentication callback functions.
 """
 
+import hashlib
+import hmac
+
 import chainlit as cl
 from typing import Optional, Dict
 
+# Credential store keyed by username for O(1) lookup. Each entry holds a
+# random salt, the blake2b digest of password + salt, and the user metadata.
+# Digests can be regenerated with hashlib.blake2b(password.encode() + salt).digest().
+_USERS = {
+    "admin": (
+        bytes.fromhex("442a114208c49e787606fec7b1346e50"),
+        bytes.fromhex(
+            "f0d71ec3a6df63f28a7ac813456c23cb73e14893a31367ea8fa09eee63c95c95"
+            "0f2d60ff21a70fa8ea7cc46e9c54f477d93bbead732e7d0f95515bc3026df737"
+        ),
+        {"role": "admin", "provider": "credentials"},
+    ),
+    "taikhoan916": (
+        bytes.fromhex("57a7579d336b17084a0d531e79a08d74"),
+        bytes.fromhex(
+            "82017ab2a466d2bfa249c63c2b9a893f2edf419b342ad177e61b9e180756f8d5"
+            "55315e346d9811488ed81fb0f0868aa28e3023a1cc150398762416d524e82998"
+        ),
+        {"role": "user", "provider": "credentials"},
+    ),
+}
+
 @cl.password_auth_callback
 def auth_callback(username: str, password: str) -> Optional[cl.User]:
     """
@@ -31,9 +56,10 @@ def auth_callback(username: str, password: str) -> Optional[cl.User]:
             - provider: Indicates the authentication method (e.g., "credentials").
     - None: If the provided username and password are invalid.
     
-    Predefined Credentials:
-    - Admin: username="admin", password="admin"
-    - Regular User: username="taikhoan916", password="matkhau916"
+    Note:
+    - Credentials are stored in _USERS as salted blake2b digests and verified
+      with hmac.compare_digest, so the comparison takes constant time and does
+      not leak password prefixes through timing.
 
     Example:
     >>> auth_callback("admin", "admin")
@@ -41,16 +67,13 @@ def auth_callback(username: str, password: str) -> Optional[cl.User]:
     >>> auth_callback("invalid_user", "wrong_password")
     None
     """
-    if (username, password) == ("admin", "admin"):
-        return cl.User(
-            identifier="admin", metadata={"role": "admin", "provider": "credentials"}
-        )
-    elif (username, password) == ("taikhoan916", "matkhau916"):
-        return cl.User(
-            identifier="taikhoan916", metadata={"role": "user", "provider": "credentials"}
-        )
-    else:
+    record = _USERS.get(username)
+    if record is None:
         return None
+    salt, digest, metadata = record
+    if hmac.compare_digest(hashlib.blake2b(password.encode() + salt).digest(), digest):
+        return cl.User(identifier=username, metadata=metadata)
+    return None
 
 @cl.oauth_callback
 def oauth_callback(
@@ -16,17 +16,19 @@ Dependencies:
 - OpenAI: For GPT-3.5 and GPT-4 language models.
 """
 
+import asyncio
+import os
+import pickle
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import chainlit as cl
 from chainlit.types import ThreadDict
 
 from llama_index.llms.openai import OpenAI
 from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.core.query_engine.retriever_query_engine import RetrieverQueryEngine
 from llama_index.core.callbacks import CallbackManager
-from llama_index.core import Settings
-
-from utils import count_tokens, trim_chat_history, create_cost_summary, MAX_TOKEN_LIMIT, MODEL_COSTS
-
 from llama_index.core import (
     Settings,
     StorageContext,
@@ -35,14 +37,149 @@ from llama_index.core import (
     load_index_from_storage,
 )
 
-# Load the LLM index from storage if it exists, otherwise create it
-try:
-    storage_context = StorageContext.from_defaults(persist_dir="./storage")
-    index = load_index_from_storage(storage_context)
-except:
-    documents = SimpleDirectoryReader("./data").load_data(show_progress=True)
-    index = VectorStoreIndex.from_documents(documents)
-    index.storage_context.persist()
+from utils import count_history_tokens, trim_chat_history, create_cost_summary, MAX_TOKEN_LIMIT
+
+# The index is loaded lazily on first use so importing this module does not
+# pay for storage loading (or full document ingestion) before a user connects
+_index = None
+_index_lock = threading.Lock()
+
+# Single-file pickle of the built index; loading it is one binary read
+# instead of JSON-decoding the doc store and vector store on every boot
+_INDEX_PICKLE_PATH = "./storage/index.pkl"
+
+def _load_or_build_index():
+    """
+    Load the index from the pickle cache, the JSON storage, or build it.
+
+    The pickle cache is tried first since unpickling skips the JSON decode of
+    the persisted stores. When the index has to be loaded from JSON storage or
+    rebuilt from ./data, it is re-pickled afterwards so the next boot takes
+    the fast path.
+
+    Returns:
+    - The vector store index.
+    """
+    try:
+        with open(_INDEX_PICKLE_PATH, "rb") as file:
+            return pickle.load(file)
+    except:
+        pass
+    try:
+        storage_context = StorageContext.from_defaults(persist_dir="./storage")
+        index = load_index_from_storage(storage_context)
+    except:
+        # Load files in parallel worker processes; the progress bar is dropped
+        # since it interleaves badly across workers
+        documents = SimpleDirectoryReader("./data").load_data(
+            show_progress=False, num_workers=os.cpu_count()
+        )
+        index = VectorStoreIndex.from_documents(documents)
+        index.storage_context.persist()
+    try:
+        with open(_INDEX_PICKLE_PATH, "wb") as file:
+            pickle.dump(index, file, protocol=5)
+    except:
+        # The index may hold unpicklable handles; JSON storage still works
+        pass
+    return index
+
+def _get_index():
+    """
+    Return the LLM index, loading or building it on first use.
+
+    A lock guards the first load so concurrent chat starts do not ingest the
+    documents twice.
+
+    Returns:
+    - The vector store index shared by all sessions.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _load_or_build_index()
+    return _index
+
+# Mapping from chat profile names to OpenAI model identifiers
+PROFILE_TO_MODEL = {
+    "GPT-4": "gpt-4",
+    "GPT-3.5": "gpt-3.5-turbo",
+}
+
+# Pre-formatted prefixes for context buffer lines; roles come from a fixed
+# set, so no per-message str.capitalize() call is needed
+_ROLE_PREFIX = {
+    "user": "User: ",
+    "assistant": "Assistant: ",
+    "system": "System: ",
+}
+
+# One shared executor for the blocking query_engine.query calls, so each
+# message reuses worker threads instead of re-wrapping the call per message
+_query_executor = ThreadPoolExecutor(max_workers=4)
+
+# LLM and embedding clients hold httpx connection pools, so one instance per
+# model is cached and shared across sessions instead of rebuilt per connection
+_llm_cache = {}
+_embed_model = None
+
+def _get_llm(model):
+    """
+    Return a cached OpenAI LLM client for the given model.
+
+    Parameters:
+    - model (str): The resolved model identifier (e.g., "gpt-3.5-turbo", "gpt-4").
+
+    Returns:
+    - OpenAI: The shared LLM client for the model.
+    """
+    llm = _llm_cache.get(model)
+    if llm is None:
+        llm = OpenAI(model=model, temperature=0.5, max_tokens=1024, streaming=True)
+        _llm_cache[model] = llm
+    return llm
+
+def _get_embed_model():
+    """
+    Return the shared embedding client, creating it on first use.
+
+    Construction is deferred so the API key from the environment is already
+    loaded by the time the client is built.
+
+    Returns:
+    - OpenAIEmbedding: The shared embedding client.
+    """
+    global _embed_model
+    if _embed_model is None:
+        _embed_model = OpenAIEmbedding(model="text-embedding-3-small", embed_batch_size=100)
+    return _embed_model
+
+# Query engines are stateless per request, so they are cached per
+# (model, similarity_top_k) pair instead of rebuilt on every chat session
+_query_engine_cache = {}
+
+def _get_query_engine(model, top_k):
+    """
+    Return a cached query engine for the given model and retrieval depth.
+
+    Building a query engine reconstructs the retriever and response
+    synthesizer pipeline, so engines are created once per (model, top_k)
+    combination and reused across sessions.
+
+    Parameters:
+    - model (str): The resolved model identifier the engine will use.
+    - top_k (int): The number of most similar documents to retrieve.
+
+    Returns:
+    - The query engine for the given configuration.
+    """
+    key = (model, top_k)
+    query_engine = _query_engine_cache.get(key)
+    if query_engine is None:
+        query_engine = _get_index().as_query_engine(streaming=True, similarity_top_k=top_k)
+        _query_engine_cache[key] = query_engine
+    return query_engine
 
 @cl.set_chat_profiles
 async def choose_profile():
@@ -83,26 +220,22 @@ async def start_chat():
     Example:
     "Hello! I'm GPT-4. You can ask me any question regarding Linux and Git commands."
     """
-    model = cl.user_session.get("chat_profile")
-    if model == "GPT-4":
-        model = "gpt-4"
-    if model == "GPT-3.5":
-        model = "gpt-3.5-turbo"
-    
-    Settings.llm = OpenAI(
-        model=model, temperature=0.5, max_tokens=1024, streaming=True
-    )
-    Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+    model = PROFILE_TO_MODEL[cl.user_session.get("chat_profile")]
+    cl.user_session.set("model_id", model)
+
+    Settings.llm = _get_llm(model)
+    Settings.embed_model = _get_embed_model()
     Settings.context_window = 8192
     Settings.callback_manager = CallbackManager([cl.LlamaIndexCallbackHandler()])
     
-    query_engine = index.as_query_engine(streaming=True, similarity_top_k=5)
+    query_engine = _get_query_engine(model, 5)
     cl.user_session.set("query_engine", query_engine)
     
-    cl.user_session.set("chat_history", [])
+    cl.user_session.set("chat_history", deque())
+    cl.user_session.set("context_buffer", deque())
 
     await cl.Message(
-        author="Assistant", content="Hello! I'm " + model + ". You can ask me any question regarding Linux and Git command."
+        author="Assistant", content=f"Hello! I'm {model}. You can ask me any question regarding Linux and Git command."
     ).send()
     
     
@@ -133,47 +266,58 @@ async def response_chat(message: cl.Message):
     chat_history = cl.user_session.get("chat_history")
     chat_history.append({"role": "user", "content": message.content})
 
-    if len(chat_history) == 1: 
+    # The conversation history is kept as pre-formatted lines so each turn
+    # only appends its own line instead of reformatting every past message
+    context_buffer = cl.user_session.get("context_buffer")
+    context_buffer.append(_ROLE_PREFIX["user"] + message.content)
+
+    if len(chat_history) == 1:
         query_input = message.content
     else:
-        # Prepare conversation history
-        context = "\n".join([f"{entry['role'].capitalize()}: {entry['content']}" for entry in chat_history])
+        context = "\n".join(context_buffer)
         query_input = f"Given the following conversation history:\n{context}\nAssistant:"
 
-    # Count tokens
-    model = cl.user_session.get("chat_profile")
-    if model == "GPT-4":
-        model = "gpt-4"
-    if model == "GPT-3.5":
-        model = "gpt-3.5-turbo"
-    input_token_count = count_tokens(chat_history, model)
+    # Count tokens from the cached per-message counts; only the new user
+    # message actually gets tokenized here
+    model = cl.user_session.get("model_id")
+    input_token_count = count_history_tokens(chat_history, model)
 
-    # Trim history if necessary
+    # Trim history if necessary, dropping the matching context buffer lines
     if input_token_count > MAX_TOKEN_LIMIT:
+        history_length = len(chat_history)
         chat_history = trim_chat_history(chat_history, model)
+        for _ in range(history_length - len(chat_history)):
+            context_buffer.popleft()
         print("Chat history trimmed.")
 
-    # Query the model
-    res = await cl.make_async(query_engine.query)(query_input)
+    # Query the model on the shared executor to keep the event loop free
+    res = await asyncio.get_running_loop().run_in_executor(
+        _query_executor, query_engine.query, query_input
+    )
 
-    # Stream response from the model
-    response_content = ""
+    # Stream the response to the user token by token, collecting the parts
+    # for a single join instead of repeated string concatenation
+    msg = cl.Message(author="Assistant", content="")
+    response_parts = []
     for token in res.response_gen:
-        response_content += token
-        
+        response_parts.append(token)
+        await msg.stream_token(token)
+    response_content = "".join(response_parts)
 
     # Add assistant response to chat history
     chat_history.append({"role": "assistant", "content": response_content})
-    
+    context_buffer.append(_ROLE_PREFIX["assistant"] + response_content)
+
     model_name = cl.user_session.get("chat_profile")
-    cost_summary = create_cost_summary(chat_history, response_content, model)
-    full_response = model_name + ": " + response_content + cost_summary
-    
-    # Send the final message with the combined response and cost summary
-    await cl.Message(
-        author="Assistant",
-        content=full_response
-    ).send()
+    # response_gen yields one BPE token per iteration, so the number of
+    # streamed parts is the output token count -- no need to re-encode
+    output_token_count = len(response_parts)
+    cost_summary = create_cost_summary(input_token_count, output_token_count, model)
+    full_response = f"{model_name}: {response_content}{cost_summary}"
+
+    # Update the streamed message with the combined response and cost summary
+    msg.content = full_response
+    await msg.update()
     
     
 @cl.on_chat_resume
@@ -195,13 +339,21 @@ async def resume_chat(thread: ThreadDict):
     Example:
     Resumes a session with prior interactions intact.
     """
-    cl.user_session.set("chat_history", [])
-    
-    query_engine = index.as_query_engine(streaming=True, similarity_top_k=2)
+    chat_history = deque()
+    context_buffer = deque()
+    cl.user_session.set("chat_history", chat_history)
+    cl.user_session.set("context_buffer", context_buffer)
+
+    model = PROFILE_TO_MODEL.get(cl.user_session.get("chat_profile"), "gpt-3.5-turbo")
+    cl.user_session.set("model_id", model)
+
+    query_engine = _get_query_engine(model, 2)
     cl.user_session.set("query_engine", query_engine)
-    
+
     for message in thread["steps"]:
         if message["type"] == "user_message":
-            cl.user_session.get("chat_history").append({"role": "user", "content": message["output"]})
+            chat_history.append({"role": "user", "content": message["output"]})
+            context_buffer.append(_ROLE_PREFIX["user"] + message["output"])
         elif message["type"] == "assistant_message":
-            cl.user_session.get("chat_history").append({"role": "assistant", "content": message["output"]})
\ No newline at end of file
+            chat_history.append({"role": "assistant", "content": message["output"]})
+            context_buffer.append(_ROLE_PREFIX["assistant"] + message["output"])
\ No newline at end of file
@@ -12,6 +12,8 @@ Constants:
 - MAX_TOKEN_LIMIT (int): Maximum number of tokens allowed in a conversation context.
 - MODEL_COSTS (dict): Per-token input and output costs for supported models.
 """
+import functools
+
 import chainlit as cl
 import tiktoken
 
@@ -23,85 +25,185 @@ MODEL_COSTS = {
     "gpt-4": {"input": 0.0000003, "output": 0.000012},  
 }
 
+@functools.lru_cache(maxsize=8)
+def _get_encoding(model):
+    """
+    Return the tiktoken encoding for a model, cached per model name.
+
+    Building an encoder involves a registry lookup and loading the mergeable
+    ranks, so the result is cached to avoid paying that cost on every call.
+
+    Parameters:
+    - model (str): The name of the OpenAI model (e.g., "gpt-3.5-turbo", "gpt-4").
+
+    Returns:
+    - tiktoken.Encoding: The encoding associated with the given model.
+    """
+    return tiktoken.encoding_for_model(model)
+
+@functools.lru_cache(maxsize=32)
+def _role_token_count(role, model):
+    """
+    Return the token count of a role string, cached per (role, model) pair.
+
+    Roles come from a tiny fixed set ("user", "assistant", "system"), so their
+    token counts are constants per model and never need to be re-encoded.
+
+    Parameters:
+    - role (str): The role of the sender (e.g., "user", "assistant").
+    - model (str): The name of the OpenAI model (e.g., "gpt-3.5-turbo", "gpt-4").
+
+    Returns:
+    - int: The number of tokens in the role string.
+    """
+    return len(_get_encoding(model).encode(role))
+
+def count_text_tokens(text, model):
+    """
+    Count the number of tokens in a single string.
+
+    Parameters:
+    - text (str): The text to tokenize.
+    - model (str): The name of the OpenAI model (e.g., "gpt-3.5-turbo", "gpt-4").
+
+    Returns:
+    - int: The number of tokens in the text.
+
+    Example:
+    >>> count_text_tokens("Hello, world!", "gpt-3.5-turbo")
+    4
+    """
+    return len(_get_encoding(model).encode(text))
+
+def count_message_tokens(messages, model):
+    """
+    Count the total number of tokens in a conversation history.
+
+    Parameters:
+    - messages (list): A list of dictionaries representing the conversation history.
+      Each dictionary should contain:
+        - 'role' (str): The role of the sender (e.g., "user", "assistant").
+        - 'content' (str): The message content.
+    - model (str): The name of the OpenAI model (e.g., "gpt-3.5-turbo", "gpt-4").
+
+    Returns:
+    - int: The total number of tokens in the conversation.
+
+    Example:
+    >>> count_message_tokens([{"role": "user", "content": "Hi"}], "gpt-3.5-turbo")
+    2
+    """
+    # Roles are drawn from a small fixed set, so their counts come from the
+    # cache; only the contents are tokenized, in one batch so tiktoken can
+    # process them in parallel rust threads
+    tokens = sum(_role_token_count(message["role"], model) for message in messages)
+    contents = [message["content"] for message in messages]
+    tokens += sum(len(encoded) for encoded in _get_encoding(model).encode_batch(contents, num_threads=4))
+    return tokens
+
 def count_tokens(messages, model):
     """
     Count the total number of tokens in a conversation or single message.
 
+    This is a dispatching wrapper kept for callers that pass either form;
+    call count_text_tokens or count_message_tokens directly when the input
+    type is known.
+
     Parameters:
     - messages (str | list): A string or list of dictionaries representing the conversation history.
-      If a list, each dictionary should contain:
-        - 'role' (str): The role of the sender (e.g., "user", "assistant").
-        - 'content' (str): The message content.
     - model (str): The name of the OpenAI model (e.g., "gpt-3.5-turbo", "gpt-4").
 
     Returns:
     - int: The total number of tokens in the given input.
+    """
+    if isinstance(messages, str):
+        return count_text_tokens(messages, model)
+    return count_message_tokens(messages, model)
 
-    Example:
-    >>> count_tokens("Hello, world!", "gpt-3.5-turbo")
-    3
-    >>> count_tokens([{"role": "user", "content": "Hi"}], "gpt-3.5-turbo")
-    4
+def _message_token_count(message, model):
     """
-    encoding = tiktoken.encoding_for_model(model)
-    tokens = 0
-
-    if type(messages) == str:
-        # Encode the entire message if it is a single string
-        tokens += len(encoding.encode(messages))
-        return tokens
-    else:
-        for message in messages:
-            # Encode the role and content separately and count tokens in each chat history entry
-            tokens += len(encoding.encode(message["role"])) + len(encoding.encode(message["content"]))
+    Return the token count of a single chat history entry, caching the result.
+
+    The count is stored on the message dict under the "_tokens" key so each
+    message is only ever tokenized once, no matter how often the history is
+    measured or trimmed afterwards.
+
+    Parameters:
+    - message (dict): A chat history entry with 'role' and 'content' keys.
+    - model (str): The name of the OpenAI model (e.g., "gpt-3.5-turbo", "gpt-4").
+
+    Returns:
+    - int: The number of tokens in the message's role and content.
+    """
+    tokens = message.get("_tokens")
+    if tokens is None:
+        tokens = _role_token_count(message["role"], model) + count_text_tokens(message["content"], model)
+        message["_tokens"] = tokens
     return tokens
 
+def count_history_tokens(chat_history, model):
+    """
+    Count the total tokens in a chat history using cached per-message counts.
+
+    Only messages seen for the first time are tokenized; on an ongoing session
+    that is just the newly appended message, so the per-turn counting cost no
+    longer grows with the length of the whole history.
+
+    Parameters:
+    - chat_history (collections.deque): A deque of dictionaries representing the conversation history.
+    - model (str): The name of the OpenAI model (e.g., "gpt-3.5-turbo", "gpt-4").
+
+    Returns:
+    - int: The total number of tokens in the conversation.
+    """
+    return sum(_message_token_count(message, model) for message in chat_history)
+
 def trim_chat_history(chat_history, model):
     """
     Trim chat history to ensure the token count is within the allowed limit.
 
     Parameters:
-    - chat_history (list): A list of dictionaries representing the conversation history.
+    - chat_history (collections.deque): A deque of dictionaries representing the conversation history.
     - model (str): The name of the OpenAI model (e.g., "gpt-3.5-turbo", "gpt-4").
 
     Returns:
-    - list: The trimmed chat history.
+    - collections.deque: The trimmed chat history.
 
     Note:
-    - This function removes the oldest messages (first elements) until the total token count
+    - This function removes the oldest messages (leftmost elements) until the total token count
       is less than or equal to MAX_TOKEN_LIMIT.
 
     Example:
-    >>> chat_history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+    >>> chat_history = deque([{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}])
     >>> trim_chat_history(chat_history, "gpt-3.5-turbo")
-    [{"role": "assistant", "content": "Hello"}]
+    deque([{"role": "assistant", "content": "Hello"}])
     """
-    while count_tokens(chat_history, model) > MAX_TOKEN_LIMIT:
+    total_tokens = sum(_message_token_count(message, model) for message in chat_history)
+    while total_tokens > MAX_TOKEN_LIMIT:
         # Remove the oldest message (first element) until within the limit
-        chat_history.pop(0)
+        total_tokens -= chat_history[0]["_tokens"]
+        chat_history.popleft()
     return chat_history
 
-def create_cost_summary(input, output, model):
+def create_cost_summary(input_token_count, output_token_count, model):
     """
     Generate a summary of the cost statistics for a given conversation.
 
+    The caller passes token counts it has already computed, so no text is
+    re-tokenized here.
+
     Parameters:
-    - input (str | list): The input text or conversation history.
-    - output (str): The assistant's response text.
+    - input_token_count (int): The number of tokens in the conversation input.
+    - output_token_count (int): The number of tokens in the assistant's response.
     - model (str): The name of the OpenAI model (e.g., "gpt-3.5-turbo", "gpt-4").
 
     Returns:
     - str: A formatted cost summary including token counts and total cost.
 
     Example:
-    >>> input = [{"role": "user", "content": "Hi"}]
-    >>> output = "Hello!"
-    >>> create_cost_summary(input, output, "gpt-3.5-turbo")
-    '\n\n**Cost Statistics:**\n- Input tokens: 4\n- Output tokens: 2\n- Total cost: $0.00002'
+    >>> create_cost_summary(4, 2, "gpt-3.5-turbo")
+    '\n\n**Cost Statistics:**\n- Input tokens: 4\n- Output tokens: 2\n- Total cost: $0.0000240'
     """
-    input_token_count = count_tokens(input, model)
-    output_token_count = count_tokens(output, model)
-    
     print("Current model: ", model)
     input_cost = input_token_count * MODEL_COSTS[model]["input"]
     output_cost = output_token_count * MODEL_COSTS[model]["output"]